@@ -3,11 +3,45 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import statsmodels.api as sm
-from scipy.stats import zscore
+from collections import namedtuple
+from scipy.stats import zscore, t as t_dist
 
 from src.analysis.misc import add_significance
 
-def plot_pairwise_comparison(df, x, y, order, comparisons=None, pvals=None, hide_ns=False, figsize=(10, 6), dpi=100, palette=None):
+class OLSResult(namedtuple('OLSResult', ['params', 'bse', 'df_resid'])):
+    """Lightweight OLS fit with the statsmodels-like attributes used downstream."""
+    __slots__ = ()
+
+    @property
+    def tvalues(self):
+        return self.params / self.bse
+
+    @property
+    def pvalues(self):
+        return pd.Series(2 * t_dist.sf(np.abs(self.tvalues), self.df_resid), index=self.params.index)
+
+    def conf_int(self, alpha=0.05):
+        """Confidence intervals of the parameters as a DataFrame with lower (0) and upper (1) columns."""
+        q = t_dist.ppf(1 - alpha / 2, self.df_resid)
+        return pd.concat([self.params - q * self.bse, self.params + q * self.bse], axis=1)
+
+def fit_ols_batch(Y, X):
+    """Fit OLS of every column of Y (DataFrame) on the shared X (DataFrame) with one least-squares solve."""
+    names = ['const'] + list(X.columns)
+    X_arr = np.column_stack([np.ones(len(X)), X.to_numpy(dtype=float)])
+    Y_arr = Y.to_numpy(dtype=float)
+
+    beta, _, rank, _ = np.linalg.lstsq(X_arr, Y_arr, rcond=None)
+    resid = Y_arr - X_arr @ beta
+    df_resid = X_arr.shape[0] - rank
+    sigma2 = (resid ** 2).sum(axis=0) / df_resid
+    se = np.sqrt(np.outer(np.diag(np.linalg.pinv(X_arr.T @ X_arr)), sigma2))
+
+    return {y: OLSResult(params=pd.Series(beta[:, k], index=names), bse=pd.Series(se[:, k], index=names), df_resid=df_resid)
+            for k, y in enumerate(Y.columns)}
+
+def plot_pairwise_comparison(df, x, y, order, comparisons=None, pvals=None, hide_ns=False, figsize=(10, 6), dpi=100, palette=None,
+                             use_fast_strip=False, seed=0):
     """
     Plot boxplots with stripplots for specified groups and optionally annotate with significance indicators.
 
@@ -21,6 +55,9 @@ def plot_pairwise_comparison(df, x, y, order, comparisons=None, pvals=None, hide
     hide_ns (bool, optional): If True, do not show non-significant comparisons (p >= 0.05). Default is False.
     figsize (tuple, optional): Figure size. Default is (10, 6).
     palette (list, optional): List of colors for the plot. Default is seaborn "deep" palette.
+    use_fast_strip (bool, optional): If True, draw the points as one jittered matplotlib scatter per group instead of 
+        sns.stripplot, which is much faster for large groups. Default is False.
+    seed (int, optional): Seed of the jitter when use_fast_strip is True. Default is 0.
 
     Returns:
     matplotlib.figure.Figure: The figure object containing the plot.
@@ -49,7 +86,19 @@ def plot_pairwise_comparison(df, x, y, order, comparisons=None, pvals=None, hide
     # plot boxplot and striplot on top
     fig, ax = plt.subplots(1, 1, figsize=figsize, dpi=dpi)
     sns.boxplot(ax=ax, x=x, y=y, data=df, order=order, palette=palette, showfliers=False)
-    sns.stripplot(ax=ax, x=x, y=y, data=df, order=order, palette=palette, linewidth=0.8, size=3, alpha=1)
+    if use_fast_strip:
+        # resolve one colour per group as seaborn does (dict keyed by group, or a palette cycled over the groups)
+        if isinstance(palette, dict):
+            colors = [palette[grp] for grp in order]
+        else:
+            colors = sns.color_palette(palette, len(order))
+        rng = np.random.default_rng(seed)
+        for pos, grp in enumerate(order):
+            vals = df.loc[df[x] == grp, y].to_numpy()
+            jitter = rng.uniform(-0.1, 0.1, vals.size)
+            ax.scatter(pos + jitter, vals, s=9, color=colors[pos], edgecolor='gray', linewidth=0.8, alpha=1, zorder=3)
+    else:
+        sns.stripplot(ax=ax, x=x, y=y, data=df, order=order, palette=palette, linewidth=0.8, size=3, alpha=1)
 
     # add significance bars with asterices
     if comparisons is not None and pvals is not None:
@@ -57,30 +106,18 @@ def plot_pairwise_comparison(df, x, y, order, comparisons=None, pvals=None, hide
     
     return fig, ax
 
-def plot_regression(df, x, y, covars=[], standardise=True, vars2std='all', ci=95,
-                    ax=None, xlabel=None, ylabel=None, hue=None, title=None, palette=None,
-                    fig_args=None, scatter_kwargs=None, line_kwargs=None, text_kwargs=None, legend_kwargs=None):
+def _standardise_regression_data(df_v, vars2std):
+    """Z-score either all columns or only the listed ones."""
+    if vars2std == 'all':
+        df_v = zscore(df_v)
+    elif type(vars2std) == list:
+        df_v[vars2std] = zscore(df_v[vars2std])
+    return df_v
 
-    # prepare data and optionally z-score
-    df_v = df[[y, x] + covars]
-    if standardise:
-        if vars2std == 'all':
-            df_v = zscore(df_v)
-        elif type(vars2std) == list:
-            df_v[vars2std] = zscore(df_v[vars2std])
-    
-    # OLS regression and extract the parameters for the main predictor
-    model = sm.OLS(df_v[y], sm.add_constant(df_v[[x] + covars])).fit()
-    b, pval = model.params[x], model.pvalues[x]
+def _plot_regression_panel(ax, df, x, y, b, pval, ci=95, xlabel=None, ylabel=None, hue=None, title=None, palette=None,
+                           scatter_kwargs=None, line_kwargs=None, text_kwargs=None, legend_kwargs=None):
+    """Draw the scatter, regression line and β/p annotation of one regression on the given axis."""
 
-    # create figure and axis if not provided
-    if ax is None:
-        if fig_args is None:
-            fig_args = dict(figsize=(2.5, 2.5), dpi=100)
-        fig, ax = plt.subplots(1, 1, **fig_args)
-    else:
-        fig = ax.figure
-    
     # set style
     if scatter_kwargs is None:
         scatter_kwargs = dict(edgecolor='#494949', color='#9f9f9f', s=30, lw=1, alpha=0.8)
@@ -105,4 +142,89 @@ def plot_regression(df, x, y, covars=[], standardise=True, vars2std='all', ci=95
     if xlabel: ax.set_xlabel(xlabel)
     if title: ax.set_title(title, y=1)
 
-    return fig, ax, model
\ No newline at end of file
+    return ax
+
+def plot_regression(df, x, y, covars=[], standardise=True, vars2std='all', ci=95,
+                    ax=None, xlabel=None, ylabel=None, hue=None, title=None, palette=None,
+                    fig_args=None, scatter_kwargs=None, line_kwargs=None, text_kwargs=None, legend_kwargs=None):
+
+    # prepare data and optionally z-score
+    df_v = df[[y, x] + covars]
+    if standardise:
+        df_v = _standardise_regression_data(df_v, vars2std)
+    
+    # OLS regression and extract the parameters for the main predictor
+    model = sm.OLS(df_v[y], sm.add_constant(df_v[[x] + covars])).fit()
+    b = model.params[x]
+    pval = 2 * t_dist.sf(abs(b / model.bse[x]), model.df_resid)
+
+    # create figure and axis if not provided
+    if ax is None:
+        if fig_args is None:
+            fig_args = dict(figsize=(2.5, 2.5), dpi=100)
+        fig, ax = plt.subplots(1, 1, **fig_args)
+    else:
+        fig = ax.figure
+    
+    _plot_regression_panel(ax, df, x, y, b, pval, ci=ci, xlabel=xlabel, ylabel=ylabel, hue=hue, title=title, palette=palette,
+                           scatter_kwargs=scatter_kwargs, line_kwargs=line_kwargs, text_kwargs=text_kwargs, 
+                           legend_kwargs=legend_kwargs)
+
+    return fig, ax, model
+
+def plot_regression_batch(df, x, ys, covars=[], standardise=True, vars2std='all', ci=95,
+                          axs=None, xlabel=None, ylabels=None, hue=None, titles=None, palette=None,
+                          fig_args=None, scatter_kwargs=None, line_kwargs=None, text_kwargs=None, legend_kwargs=None):
+    """
+    Plot regressions of several outcomes on the same predictor (and covariates), fitting all of them at once.
+
+    All outcomes share the design matrix, so the models are solved with a single least-squares call instead of
+    one fit per outcome. Rows are used as given, so handle missing values beforehand.
+
+    Parameters:
+    df (pandas.DataFrame): DataFrame containing the data to plot.
+    x (str): Column name of the main predictor.
+    ys (list of str): Column names of the outcomes, one panel per outcome.
+    covars (list of str, optional): Covariate column names. Default is an empty list.
+    standardise (bool, optional): If True, z-score the variables given by vars2std. Default is True.
+    vars2std (str or list, optional): 'all' or a list of columns to z-score. Default is 'all'.
+    axs (array of matplotlib.axes.Axes, optional): Axes to plot into, one per outcome. Default creates a row of subplots.
+    ylabels, titles (list of str, optional): Per-outcome y-axis labels and titles.
+    Other arguments are passed on as in plot_regression.
+
+    Returns:
+    matplotlib.figure.Figure: The figure object containing the plots.
+    numpy.ndarray: The axes of the plots.
+    dict: OLSResult for each outcome.
+
+    Usage:
+    >>> fig, axs, models = plot_regression_batch(df, x='ab_LI', ys=['tau_temporal_LI', 'tau_parietal_LI'], covars=['age'])
+    """
+
+    # prepare data and optionally z-score
+    df_v = df[list(ys) + [x] + covars]
+    if standardise:
+        df_v = _standardise_regression_data(df_v, vars2std)
+
+    # OLS regressions for all outcomes
+    models = fit_ols_batch(df_v[list(ys)], df_v[[x] + covars])
+
+    # create figure and axes if not provided
+    if axs is None:
+        if fig_args is None:
+            fig_args = dict(figsize=(2.5 * len(ys), 2.5), dpi=100)
+        fig, axs = plt.subplots(1, len(ys), **fig_args)
+    axs = np.atleast_1d(axs).ravel()
+    fig = axs[0].figure
+
+    for i, y in enumerate(ys):
+        model = models[y]
+        b = model.params[x]
+        pval = 2 * t_dist.sf(abs(b / model.bse[x]), model.df_resid)
+        _plot_regression_panel(axs[i], df, x, y, b, pval, ci=ci, xlabel=xlabel, 
+                               ylabel=ylabels[i] if ylabels else None, hue=hue, 
+                               title=titles[i] if titles else None, palette=palette,
+                               scatter_kwargs=scatter_kwargs, line_kwargs=line_kwargs, text_kwargs=text_kwargs, 
+                               legend_kwargs=legend_kwargs)
+
+    return fig, axs, models
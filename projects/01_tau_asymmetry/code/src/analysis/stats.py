@@ -1,9 +1,22 @@
 import numpy as np
 import pandas as pd
-from scipy.stats import ttest_ind
 from statsmodels.stats.multitest import multipletests
-from statsmodels.formula.api import ols
-from scipy.stats import zscore
+import statsmodels.api as sm
+import patsy
+from scipy.stats import zscore, t as t_dist
+
+def _ols_last_tstat(X, Y):
+    """Fit an OLS model with design X to every column of Y (or a single response vector) and return t- and p-values of the last regressor."""
+    X_pinv = np.linalg.pinv(X)
+    beta = X_pinv @ Y
+    resid = Y - X @ beta
+    df_resid = X.shape[0] - np.linalg.matrix_rank(X)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = (resid ** 2).sum(axis=0) / df_resid
+        se = np.sqrt(sigma2 * (X_pinv @ X_pinv.T)[-1, -1])
+        tvals = beta[-1] / se
+    pvals = 2 * t_dist.sf(np.abs(tvals), df_resid)
+    return tvals, pvals
 
 def ttest_comparison(data_dict, comparisons, posthoc='fdr_bh'):
     """
@@ -29,11 +42,32 @@ def ttest_comparison(data_dict, comparisons, posthoc='fdr_bh'):
     >>> tvals, pvals, pvals_cor = ttest_comparison(data, comparisons)
     """
 
-    # loop through all comparisons
-    tvals, pvals, pvals_cor = {}, {}, {}
-    for grps in comparisons:
-        # run independent t-test and get tvals and pvals 
-        tvals[grps], pvals[grps] = ttest_ind(data_dict[grps[0]], data_dict[grps[1]])
+    # compute the mean, variance and size of each compared group once (along axis 0, as scipy's ttest_ind)
+    groups = {grp for grps in comparisons for grp in grps}
+    group_stats = {}
+    for grp in groups:
+        data = np.asarray(data_dict[grp], dtype=float)
+        group_stats[grp] = (data.mean(axis=0), data.var(axis=0, ddof=1), data.shape[0])
+
+    def _stack_stats(side):
+        means = np.array([group_stats[grps[side]][0] for grps in comparisons])
+        variances = np.array([group_stats[grps[side]][1] for grps in comparisons])
+        # sizes broadcast against the per-column statistics of multi-column data
+        sizes = np.array([group_stats[grps[side]][2] for grps in comparisons]).reshape((-1,) + (1,) * (means.ndim - 1))
+        return means, variances, sizes
+
+    m_a, v_a, n_a = _stack_stats(0)
+    m_b, v_b, n_b = _stack_stats(1)
+
+    # run independent t-tests (pooled variance as in scipy's ttest_ind) for all comparisons at once
+    dof = n_a + n_b - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled_var = ((n_a - 1) * v_a + (n_b - 1) * v_b) / dof
+        _tvals = (m_a - m_b) / np.sqrt(pooled_var * (1 / n_a + 1 / n_b))
+    _pvals = 2 * t_dist.sf(np.abs(_tvals), dof)
+    tvals = dict(zip(comparisons, _tvals))
+    pvals = dict(zip(comparisons, _pvals))
+    pvals_cor = {}
     
     # perform post-hoc test if requested and supply corrected pvals
     if posthoc:
@@ -76,6 +110,10 @@ def ols_comparison(dfs, data_dict, comparisons, covars=[], standardise=True, pos
     >>> tvals, pvals, pvals_cor, models = ols_comparison(dfs, data, comparisons, covars=['cov1', 'cov2'])
     """
 
+    # build the formula once for all comparisons
+    covariate_str = " + ".join(covars)
+    formula = f"value ~ {covariate_str} + group_bin" if covariate_str else "value ~ group_bin"
+
     # loop through all comparisons
     tvals, pvals, pvals_cor, models = {}, {}, {}, {}
     for grps in comparisons:
@@ -95,12 +133,11 @@ def ols_comparison(dfs, data_dict, comparisons, covars=[], standardise=True, pos
             df_pair.iloc[:, 1:] = zscore(df_pair.iloc[:, 1:])
         
         # create the binary group variable
-        df_pair['group_bin'] = df_pair['Group'].apply(lambda x: 1 if x == grps[0] else 0)
+        df_pair['group_bin'] = (df_pair['Group'].to_numpy() == grps[0]).astype(np.int8)
         
-        # build the formula and fit the model
-        covariate_str = " + ".join(covars)
-        formula = f"value ~ {covariate_str} + group_bin" if covariate_str else "value ~ group_bin"
-        model = ols(formula, data=df_pair).fit()
+        # build the design matrix from the formula and fit the model
+        y, X = patsy.dmatrices(formula, df_pair, return_type='dataframe')
+        model = sm.OLS(y, X).fit()
         
         # extract results
         tvals[grps] = model.tvalues['group_bin']
@@ -131,7 +168,8 @@ def ols_matrix_comparison(dfs, data_dict, comparison, covars=[], posthoc='fdr_bh
     comparison (list of str): List containing two group names to compare.
     covars (list of str, optional): List of covariate column names to include in the model. Default is an empty list.
     posthoc (str, optional): Method for post-hoc p-value adjustment. Default is 'fdr_bh'.
-    verbose (bool, optional): If True, print model summaries for each ROI pair comparison. Default is False.
+    verbose (bool, optional): If True, print model summaries for each ROI pair comparison (each pair is then also fitted
+        with statsmodels, which is slow for large matrices). Default is False.
 
     Returns:
     tuple: (tvals, pvals, pvals_cor)
@@ -152,65 +190,60 @@ def ols_matrix_comparison(dfs, data_dict, comparison, covars=[], posthoc='fdr_bh
     >>> tvals, pvals, pvals_cor = ols_matrix_comparison(dfs, data_dict, comparison, covars=['cov1', 'cov2'])
     """
 
-    # prepare data for the compared pair
-    data_list = []
-    df_covars = pd.DataFrame()
-    for grp in comparison:
-        df_covars = pd.concat([df_covars, dfs[grp][covars]], axis=0).reset_index(drop=True)
-        for i in range(data_dict[grp].shape[-1]):
-            data_list.append({'Group': grp, 'value': data_dict[grp][:, :, i]})
-    df_pair = pd.concat([pd.DataFrame(data_list), df_covars], axis=1)
-
-    # create the binary group variable
-    df_pair['group_bin'] = df_pair['Group'].apply(lambda x: 1 if x == comparison[0] else 0)
-
-    # loop through all pairs of ROIs in the matrix
-    n_rois = data_dict[comparison[0]].shape[0]
-    tvals = np.zeros((n_rois, n_rois))
-    pvals = np.zeros((n_rois, n_rois))
+    # stack the connectivity matrices as (subjects, ROIs, ROIs) next to the group and covariate arrays
+    values = np.concatenate([np.moveaxis(data_dict[grp], -1, 0) for grp in comparison], axis=0)
+    group_bin = np.concatenate([np.full(data_dict[grp].shape[-1], 1.0 if grp == comparison[0] else 0.0)
+                                for grp in comparison])
+    covar_arr = pd.concat([dfs[grp][covars] for grp in comparison], axis=0).to_numpy(dtype=float)
+
+    # build the design matrix (constant, covariates, group_bin)
+    n_subj, n_rois = values.shape[:2]
+    X = np.column_stack([np.ones(n_subj), covar_arr, group_bin])
+    Y = values.reshape(n_subj, -1).astype(float)
+
+    # a subject enters the model of an ROI pair only if its value is non-zero and finite
+    valid = (Y != 0) & np.isfinite(Y) & np.isfinite(X).all(axis=1)[:, None]
+    tvals = np.full(n_rois * n_rois, np.nan)
+    pvals = np.full(n_rois * n_rois, np.nan)
+
+    # ROI pairs with the same set of valid subjects share a design matrix, so fit each set with one batched GLM
+    fitted = np.flatnonzero(valid.any(axis=0))
+    if fitted.size:
+        masks, inverse, counts = np.unique(valid[:, fitted], axis=1, return_inverse=True, return_counts=True)
+        groups = np.split(fitted[np.argsort(inverse.ravel(), kind='stable')], np.cumsum(counts)[:-1])
+        for mask, cols in zip(masks.T, groups):
+            tvals[cols], pvals[cols] = _ols_last_tstat(X[mask], Y[np.ix_(mask, cols)])
+
+    tvals = tvals.reshape(n_rois, n_rois)
+    pvals = pvals.reshape(n_rois, n_rois)
     pvals_cor = np.zeros((n_rois, n_rois))
-    for i in range(n_rois):
-        for j in range(n_rois):
-            # prepare a dataframe for the current ROI pair
-            roi_values = [
-                {'value': row['value'][i, j], 'group_bin': row['group_bin'], **row[covars].to_dict()}
-                for index, row in df_pair.iterrows()
-                if np.any(row['value'][i, j] != 0) and np.isfinite(row['value'][i, j])
-            ]
-            
-            if roi_values:
-                df_roi = pd.DataFrame(roi_values)
-
-                # build the formula and fit the model
-                if covars:
-                    covariate_str = " + ".join(covars)
-                    formula = f"value ~ {covariate_str} + group_bin"
-                else:
-                    formula = "value ~ group_bin"
-                model = ols(formula, data=df_roi).fit()
-
-                # print summary for each comparison if verbose is True
-                if verbose:
-                    print(f"Comparison of ROI {i} vs ROI {j}\n{model.summary()}\n")
-
-                # extract results
-                tvals[i, j] = model.tvalues['group_bin']
-                pvals[i, j] = model.pvalues['group_bin']
-            else:
-                tvals[i, j], pvals[i, j] = np.nan, np.nan
+
+    # print the model summary of each fitted ROI pair if verbose is True (refitted with statsmodels for the full summary)
+    if verbose:
+        df_design = pd.DataFrame(X, columns=['Intercept'] + list(covars) + ['group_bin'])
+        for k in fitted:
+            mask = valid[:, k]
+            model = sm.OLS(pd.Series(Y[mask, k], name='value'), df_design[mask]).fit()
+            print(f"Comparison of ROI {k // n_rois} vs ROI {k % n_rois}\n{model.summary()}\n")
     
     # perform post-hoc test if requested and supply corrected pvals
     if posthoc:
-        # flatten the p-values array and filter out np.nan values
-        pvals_flat = pvals.flatten()
-        valid_mask = ~np.isnan(pvals_flat)
-        valid_pvals = pvals_flat[valid_mask]
+        # a symmetric p-value matrix (from symmetric connectomes) holds each test twice, so correct only
+        # the upper triangle (incl. diagonal) and mirror it; otherwise correct all ROI pairs
+        symmetric = np.allclose(pvals, pvals.T, equal_nan=True)
+        idx = np.triu_indices(n_rois) if symmetric else np.nonzero(np.ones(pvals.shape, dtype=bool))
+        _pvals = pvals[idx]
+        valid = ~np.isnan(_pvals)
         
-        # apply FDR correction to the valid p-values
-        _, _pvals_cor, _, _ = multipletests(valid_pvals, alpha=0.05, method=posthoc)
+        # apply the correction to the valid p-values
+        _pvals_cor = np.full(_pvals.shape, np.nan)
+        if valid.any():
+            _pvals_cor[valid] = multipletests(_pvals[valid], alpha=0.05, method=posthoc)[1]
         
         # map the corrected p-values back to their original positions
         pvals_cor = np.full(pvals.shape, np.nan)
-        pvals_cor[valid_mask.reshape(pvals.shape)] = _pvals_cor
+        pvals_cor[idx] = _pvals_cor
+        if symmetric:
+            pvals_cor.T[idx] = _pvals_cor
 
     return tvals, pvals, pvals_cor
\ No newline at end of file
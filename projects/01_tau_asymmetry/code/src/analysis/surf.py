@@ -1,12 +1,48 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from functools import lru_cache
 
 from enigmatoolbox.utils.parcellation import parcel_to_surface
-from brainspace.utils.parcellation import map_to_labels
 from brainspace.datasets import load_parcellation, load_conte69
 from brainspace.plotting import plot_hemispheres
 
+# Desikan-Killiany (aparc) cortical regions in the order expected by the ENIGMA toolbox
+_APARC_REGIONS = (
+    'bankssts', 'caudalanteriorcingulate', 'caudalmiddlefrontal', 'cuneus',
+    'entorhinal', 'fusiform', 'inferiorparietal', 'inferiortemporal',
+    'isthmuscingulate', 'lateraloccipital', 'lateralorbitofrontal', 'lingual',
+    'medialorbitofrontal', 'middletemporal', 'parahippocampal', 'paracentral',
+    'parsopercularis', 'parsorbitalis', 'parstriangularis', 'pericalcarine',
+    'postcentral', 'posteriorcingulate', 'precentral', 'precuneus',
+    'rostralanteriorcingulate', 'rostralmiddlefrontal', 'superiorfrontal',
+    'superiorparietal', 'superiortemporal', 'supramarginal', 'frontalpole',
+    'temporalpole', 'transversetemporal', 'insula'
+)
+_APARC_LABELS = tuple(f'L_{r}' for r in _APARC_REGIONS) + tuple(f'R_{r}' for r in _APARC_REGIONS)
+
+@lru_cache(maxsize=None)
+def _get_conte69():
+    """Load the conte69 surfaces once (plot_hemispheres overwrites the arrays it attaches to them)."""
+    return load_conte69()
+
+@lru_cache(maxsize=None)
+def _get_schaefer400():
+    """Load the Schaefer 400 vertex labels once as a read-only array."""
+    labels = load_parcellation('schaefer', scale=400, join=True)
+    labels.flags.writeable = False
+    return labels
+
+@lru_cache(maxsize=None)
+def _get_schaefer400_roi_index():
+    """Map each Schaefer 400 vertex to the position of its parcel in the sorted parcel ids (-1 for the medial wall)."""
+    labels = _get_schaefer400()
+    nonzero = labels != 0
+    parcel_ids = np.unique(labels[nonzero])
+    vertex_roi = np.where(nonzero, np.searchsorted(parcel_ids, labels), -1)
+    vertex_roi.flags.writeable = False
+    return vertex_roi, len(parcel_ids)
+
 def shorten_dk_names(original_dict):
     new_dict = {}
     for key, value in original_dict.items():
@@ -23,21 +59,12 @@ def shorten_dk_names(original_dict):
     return new_dict
 
 def assign_val2roi(regions, value, side_prefixes=['L', 'R']):
-    # loop through all regions
+    # modify the names of hippocampus and amygdala
     name_variations = {'Hippocampus': 'hippo', 'Amygdala': 'amyg'}
-    roi_dict = {}
-    for region in regions:
-        # modify the names of hippocampus and amygdala
-        if region in name_variations:
-            region_key = name_variations[region]
-        else:
-            region_key = region
-        
-        # assign the value to regions in both hemispheres
-        roi_dict[f'{side_prefixes[0]}_{region_key}'] = value
-        roi_dict[ f'{side_prefixes[1]}_{region_key}'] = value
-    
-    return roi_dict
+    region_keys = [name_variations.get(region, region) for region in regions]
+
+    # assign the value to regions in both hemispheres
+    return {f'{side}_{region_key}': value for region_key in region_keys for side in side_prefixes[:2]}
 
 def plot_surface(data, atlas, figsize=None, layout_style='row', cmap='viridis', cmap_range=None, cbar=True, 
                  output='notebook', plot_kwargs=None):
@@ -112,23 +139,10 @@ def plot_surface(data, atlas, figsize=None, layout_style='row', cmap='viridis',
     ...             output='brain_plot.png', cmap='RdBu_r')
     """
 
-    # fetch labels of the atlas
+    # fetch labels of the atlas (schaefer400 vertices are mapped through the cached index below)
     if atlas == 'aparc':
-        _labels = [
-            'bankssts', 'caudalanteriorcingulate', 'caudalmiddlefrontal', 'cuneus',
-            'entorhinal', 'fusiform', 'inferiorparietal', 'inferiortemporal',
-            'isthmuscingulate', 'lateraloccipital', 'lateralorbitofrontal', 'lingual',
-            'medialorbitofrontal', 'middletemporal', 'parahippocampal', 'paracentral',
-            'parsopercularis', 'parsorbitalis', 'parstriangularis', 'pericalcarine',
-            'postcentral', 'posteriorcingulate', 'precentral', 'precuneus',
-            'rostralanteriorcingulate', 'rostralmiddlefrontal', 'superiorfrontal',
-            'superiorparietal', 'superiortemporal', 'supramarginal', 'frontalpole',
-            'temporalpole', 'transversetemporal', 'insula'
-        ]
-        labels = [f'L_{r}' for r in _labels] + [f'R_{r}' for r in _labels]
-    elif atlas == 'schaefer400':
-        labels = load_parcellation('schaefer', scale=400, join=True)
-    else:
+        labels = list(_APARC_LABELS)
+    elif atlas != 'schaefer400':
         raise TypeError(f"Atlas must be either 'aparc' or 'schaefer400', not '{atlas}'.")
 
     # check input data
@@ -145,8 +159,11 @@ def plot_surface(data, atlas, figsize=None, layout_style='row', cmap='viridis',
         vertex_values = parcel_to_surface(s_values, 'aparc_conte69')
         vertex_values[vertex_values == 0] = np.nan
     elif atlas == 'schaefer400':
-        vertex_values = map_to_labels(s_values, labels, mask=labels!=0)
-        vertex_values[labels == 0] = np.nan
+        # gather parcel values to vertices with a precomputed index (same ordering as brainspace's map_to_labels)
+        vertex_roi, n_parcels = _get_schaefer400_roi_index()
+        if len(s_values) != n_parcels:
+            raise ValueError(f"Data must have {n_parcels} values for the Schaefer 400 atlas, not {len(s_values)}.")
+        vertex_values = np.where(vertex_roi >= 0, s_values[vertex_roi.clip(0)], np.nan)
     
     # set output type
     if output == 'notebook':
@@ -178,7 +195,7 @@ def plot_surface(data, atlas, figsize=None, layout_style='row', cmap='viridis',
         plot_kwargs = dict(nan_color=(0.8, 0.8, 0.8, 1), zoom=1.35, transparent_bg=False, scale=5)
     
     # load conte69 surfaces
-    surf_lh, surf_rh = load_conte69()
+    surf_lh, surf_rh = _get_conte69()
 
     # return plot
     return plot_hemispheres(surf_lh, surf_rh, array_name=vertex_values, size=figsize, layout_style=layout_style,
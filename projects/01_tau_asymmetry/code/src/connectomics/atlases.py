@@ -1,12 +1,39 @@
 import os
+import re
 import numpy as np
-import pandas as pd
+from functools import lru_cache
 import nibabel as nib
 from nilearn import plotting, datasets
 import matplotlib.pyplot as plt
 
 from src.utils import misc
 
+# replacements applied to FreeSurfer label names (fs_default.txt and FreeSurferColorLUT.txt respectively)
+_MRTRIX_REPLACEMENTS = {
+    'ctx-lh-': 'L_', 'ctx-rh-': 'R_', 'Left-': 'L_', 'Right-': 'R_',
+    '-Cortex': '', '-Proper': 'proper', '-area': 'area',
+}
+_LUT_REPLACEMENTS = {
+    'ctx-lh-': 'L_', 'ctx-rh-': 'R_', 'Left-': 'L_', 'Right-': 'R_',
+    '-Cortex': '', '-Proper*': 'proper', '-area': 'area',
+}
+
+def _compile_replacements(replacements):
+    """Compile replacement keys into one regex, longest keys first so overlapping keys resolve consistently."""
+    return re.compile('|'.join(re.escape(key) for key in sorted(replacements, key=len, reverse=True)))
+
+_MRTRIX_REPLACEMENTS_RE = _compile_replacements(_MRTRIX_REPLACEMENTS)
+_LUT_REPLACEMENTS_RE = _compile_replacements(_LUT_REPLACEMENTS)
+
+def _format_label(label_name, replacements, replacements_re):
+    """Convert a FreeSurfer label name to the 'region_L'/'region_R' format."""
+    label_name = replacements_re.sub(lambda match: replacements[match.group(0)], label_name)
+    if label_name.startswith('L_'):
+        label_name = label_name[2:].lower() + '_L'
+    elif label_name.startswith('R_'):
+        label_name = label_name[2:].lower() + '_R'
+    return label_name
+
 def fetch_dk_atlas(coords=False, lut_idx=False):
     """Load Desikan-Killiany atlas' image and labels (and optionally coordinates)."""
     
@@ -14,7 +41,7 @@ def fetch_dk_atlas(coords=False, lut_idx=False):
     src_dir = misc.find_src_directory()
     file_path = os.path.join(src_dir, 'resources', 'atlases', 'fs_aparcaseg_dk', 'aparc+aseg_mni_relabel.nii.gz')
     
-    dk_img = nib.load(file_path)
+    dk_img = _load_img(file_path)
     
     # get labels as dict with values as either LUT IDs or just iterations
     if lut_idx:
@@ -24,23 +51,57 @@ def fetch_dk_atlas(coords=False, lut_idx=False):
 
     # get coordinates of the labels
     if coords: 
-        dk_coords = plotting.find_parcellation_cut_coords(dk_img)
+        dk_coords = _get_cut_coords(dk_img, 'dk').copy()
         return dk_img, dk_labels, dk_coords
 
     return dk_img, dk_labels
 
+@lru_cache(maxsize=None)
+def _load_img(file_path):
+    """Load an atlas image once per file path."""
+    return nib.load(file_path)
+
 def fetch_schaefer_atlas(n_rois=400, coords=False):
     """Load Schaefer 2018 atlas' image and labels (and optionally coordinates)."""
 
-    schaefer_dict = datasets.fetch_atlas_schaefer_2018(n_rois=n_rois) 
-    schaefer_img = nib.load(schaefer_dict['maps'])
-    schaefer_labels = {label.decode('utf-8'): float(idx+1) for idx, label in enumerate(schaefer_dict['labels'])}
+    schaefer_img, schaefer_labels = _load_schaefer_atlas(n_rois)
+    schaefer_labels = dict(schaefer_labels)
     if coords: 
-        schaefer_coords = plotting.find_parcellation_cut_coords(schaefer_img)
+        schaefer_coords = _get_cut_coords(schaefer_img, f'schaefer{n_rois}').copy()
         return schaefer_img, schaefer_labels, schaefer_coords
 
     return schaefer_img, schaefer_labels
 
+@lru_cache(maxsize=None)
+def _load_schaefer_atlas(n_rois):
+    """Fetch and load Schaefer 2018 atlas once per number of ROIs."""
+    schaefer_dict = datasets.fetch_atlas_schaefer_2018(n_rois=n_rois) 
+    schaefer_img = nib.load(schaefer_dict['maps'])
+    schaefer_labels = tuple((label.decode('utf-8'), float(idx+1)) for idx, label in enumerate(schaefer_dict['labels']))
+    return schaefer_img, schaefer_labels
+
+@lru_cache(maxsize=None)
+def _get_cut_coords(img, key):
+    """
+    Find the parcellation cut coordinates once and cache them on disk (resources/atlases/_coords_{key}.npz),
+    together with the modification time of the atlas file so that an updated atlas is recomputed.
+    """
+    atlas_path = img.get_filename()
+    atlas_mtime = os.stat(atlas_path).st_mtime_ns if atlas_path else None
+    cache_path = os.path.join(misc.find_src_directory(), 'resources', 'atlases', f'_coords_{key}.npz')
+    if atlas_mtime is not None and os.path.isfile(cache_path):
+        with np.load(cache_path) as cached:
+            if cached['atlas_mtime'] == atlas_mtime:
+                return cached['coords']
+
+    atlas_coords = plotting.find_parcellation_cut_coords(img)
+    if atlas_mtime is not None:
+        try:
+            np.savez(cache_path, coords=atlas_coords, atlas_mtime=atlas_mtime)
+        except OSError:
+            pass
+    return atlas_coords
+
 def fetch_fs_mrtrix_labels(original_labels=False, drop_unknown=True, drop_duplicate_thalamus=True):
     """
     Reads the fs_default.txt file containing FreeSurfer labels and returns a dictionary mapping label names to indexes.
@@ -50,11 +111,12 @@ def fetch_fs_mrtrix_labels(original_labels=False, drop_unknown=True, drop_duplic
     # src_dir = os.path.abspath(os.path.join(os.getcwd(), '../../../src'))
     src_dir = misc.find_src_directory()
     file_path = os.path.join(src_dir, 'resources', 'fs_labels', 'fs_default.txt')
-    
-    replacements = {
-        'ctx-lh-': 'L_', 'ctx-rh-': 'R_', 'Left-': 'L_', 'Right-': 'R_',
-        '-Cortex': '', '-Proper': 'proper', '-area': 'area',
-    }
+
+    return dict(_read_fs_mrtrix_labels(file_path, original_labels, drop_unknown, drop_duplicate_thalamus))
+
+@lru_cache(maxsize=None)
+def _read_fs_mrtrix_labels(file_path, original_labels, drop_unknown, drop_duplicate_thalamus):
+    """Parse fs_default.txt once per set of arguments and return the (label, index) pairs."""
 
     # Open and read the file
     label_dict = {}
@@ -63,30 +125,25 @@ def fetch_fs_mrtrix_labels(original_labels=False, drop_unknown=True, drop_duplic
             # Skip comments and empty lines
             if line.startswith('#') or not line.strip():
                 continue
-            # Split the line into components
-            parts = line.split()
+            # Split the line into components (only the first three are used)
+            parts = line.split(maxsplit=3)
             if len(parts) >= 3:
                 # Extract the index and label name
                 index = int(parts[0])
                 label_name = parts[2]
                 if drop_unknown:
-                    if label_name in ('Unknown'):
+                    if label_name == 'Unknown':
                         continue
                 if drop_duplicate_thalamus:
                     if label_name in ('Left-Thalamus', 'Right-Thalamus'):
                         continue
                 # Modify the label name if requested
                 if not original_labels:
-                    for old, new in replacements.items():
-                        label_name = label_name.replace(old, new)
-                    if label_name.startswith('L_'):
-                        label_name = label_name[2:].lower() + '_L'
-                    elif label_name.startswith('R_'):
-                        label_name = label_name[2:].lower() + '_R'
+                    label_name = _format_label(label_name, _MRTRIX_REPLACEMENTS, _MRTRIX_REPLACEMENTS_RE)
                 # Add to the dictionary
                 label_dict[label_name] = index
 
-    return label_dict
+    return tuple(label_dict.items())
 
 def fetch_fs_lut_labels(original_labels=False):
     """
@@ -97,14 +154,15 @@ def fetch_fs_lut_labels(original_labels=False):
     # src_dir = os.path.abspath(os.path.join(os.getcwd(), '../../../src'))
     src_dir = misc.find_src_directory()
 
-    replacements = {
-        'ctx-lh-': 'L_', 'ctx-rh-': 'R_', 'Left-': 'L_', 'Right-': 'R_',
-        '-Cortex': '', '-Proper*': 'proper', '-area': 'area',
-    }
-
     # Construct the path to the FreeSurferColorLUT.txt file
     file_path = os.path.join(src_dir, 'resources', 'fs_labels', 'FreeSurferColorLUT.txt')
 
+    return dict(_read_fs_lut_labels(file_path, original_labels))
+
+@lru_cache(maxsize=None)
+def _read_fs_lut_labels(file_path, original_labels):
+    """Parse FreeSurferColorLUT.txt once per set of arguments and return the (label, index) pairs."""
+
     # Open and read the file
     label_dict = {}
     with open(file_path, 'r') as file:
@@ -113,8 +171,8 @@ def fetch_fs_lut_labels(original_labels=False):
             if line.startswith('#') or not line.strip():
                 continue
             
-            # Split the line into components
-            parts = line.split()
+            # Split the line into components (only the first three are used)
+            parts = line.split(maxsplit=3)
             if len(parts) >= 3:
                 # Extract the index and label name
                 index = int(parts[0])
@@ -122,21 +180,12 @@ def fetch_fs_lut_labels(original_labels=False):
 
                 # Modify the label name if requested
                 if not original_labels:
-                    for old, new in replacements.items():
-                        label_name = label_name.replace(old, new)
-                    if label_name.startswith('L_'):
-                        label_name = label_name[2:].lower() + '_L'
-                    elif label_name.startswith('R_'):
-                        label_name = label_name[2:].lower() + '_R'
+                    label_name = _format_label(label_name, _LUT_REPLACEMENTS, _LUT_REPLACEMENTS_RE)
                 
                 # Add to the dictionary
                 label_dict[label_name] = index
     
-    return label_dict
-
-def sortby_ordered_dict(item, dict_ordered):
-    key, _ = item
-    return dict_ordered.get(key, float('inf'))
+    return tuple(label_dict.items())
 
 def get_dk_fs_lut(sort=True):
     
@@ -144,13 +193,12 @@ def get_dk_fs_lut(sort=True):
     # _, dk_labels = fetch_dk_atlas()
     dk_labels = fetch_fs_mrtrix_labels()
 
-    for label in list(fs_lut_dict):
-        if label not in list(dk_labels):
-            del fs_lut_dict[label]
+    # keep only the labels present in the DK atlas
+    fs_lut_dict = {label: index for label, index in fs_lut_dict.items() if label in dk_labels}
     
     if sort:
-        # fs_lut_dict = dict(sorted(fs_lut_dict.items(), key=sort_left_first))
-        fs_lut_dict = dict(sorted(fs_lut_dict.items(), key=lambda item: sortby_ordered_dict(item, dk_labels)))
+        # order the labels by their DK atlas index
+        fs_lut_dict = dict(sorted(fs_lut_dict.items(), key=lambda item: dk_labels[item[0]]))
     
     return fs_lut_dict
 
@@ -167,38 +215,33 @@ def get_dk_hemisphere_mask(dk_labels, type='interhemi', plot=False):
     right_indices = {label: index for label, index in dk_labels.items() if '_R' in label}
 
     # exclude cerebellum and brainstem regions
-    exclude_indices = [index for label, index in dk_labels.items() if 'cerebellum' in label.lower() or 'brainstem' in label.lower()]
+    exclude_indices = {index for label, index in dk_labels.items() if 'cerebellum' in label.lower() or 'brainstem' in label.lower()}
+
+    # zero-based matrix positions of the included regions in each hemisphere
+    left_idx = np.fromiter((i-1 for i in left_indices.values() if i not in exclude_indices), dtype=int)
+    right_idx = np.fromiter((i-1 for i in right_indices.values() if i not in exclude_indices), dtype=int)
 
     if type == 'interhemi':
-        for i in left_indices.values():
-            for j in right_indices.values():
-                if i not in exclude_indices and j not in exclude_indices:
-                    mask[i-1, j-1] = True
-                    mask[j-1, i-1] = True
+        mask[np.ix_(left_idx, right_idx)] = True
+        mask |= mask.T
     elif type == 'intrahemi':
-        for i in left_indices.values():
-            for j in left_indices.values():
-                if i != j and i not in exclude_indices and j not in exclude_indices:
-                    mask[i-1, j-1] = True
-                    mask[j-1, i-1] = True
-        for i in right_indices.values():
-            for j in right_indices.values():
-                if i != j and i not in exclude_indices and j not in exclude_indices:
-                    mask[i-1, j-1] = True
-                    mask[j-1, i-1] = True 
+        mask[np.ix_(left_idx, left_idx)] = True
+        mask[np.ix_(right_idx, right_idx)] = True
+        np.fill_diagonal(mask, False)
     elif type == 'full':
-        for i in range(1, len(dk_labels)+1):
-            for j in range(1, len(dk_labels)+1):
-                if i not in exclude_indices and j not in exclude_indices:
-                    mask[i-1, j-1] = True
+        keep_idx = np.fromiter((i-1 for i in range(1, len(dk_labels)+1) if i not in exclude_indices), dtype=int)
+        mask[np.ix_(keep_idx, keep_idx)] = True
     elif type == 'interhemi_pairs':
+        # align left and right hemisphere regions by their matching label
+        pairs = []
         for left_label, left_index in left_indices.items():
-            right_label = left_label.replace('_L', '_R')
-            if right_label in right_indices:
-                right_index = right_indices[right_label]
-                if left_index not in exclude_indices and right_index not in exclude_indices:
-                    mask[left_index-1, right_index-1] = True
-                    mask[right_index-1, left_index-1] = True
+            right_index = right_indices.get(left_label.replace('_L', '_R'))
+            if right_index is not None and left_index not in exclude_indices and right_index not in exclude_indices:
+                pairs.append((left_index-1, right_index-1))
+        if pairs:
+            left_idx, right_idx = np.array(pairs, dtype=int).T
+            mask[left_idx, right_idx] = True
+            mask[right_idx, left_idx] = True
     
     if plot:
         fig = plt.figure(figsize=(20, 20))
@@ -226,12 +269,11 @@ def roidict2hemispheric(roi_dict):
     ... }
     >>> roi_dict_hemi = roidict2hemispheric(anatomical_rois)
     """
-    roi_dict_hemi = {}
-    for roi, regions in roi_dict.items():
-        roi_dict_hemi[f"{roi}_L"] = [f"{reg}_L" for reg in regions]
-    for roi, regions in roi_dict.items():
-        roi_dict_hemi[f"{roi}_R"] = [f"{reg}_R" for reg in regions]
-    return roi_dict_hemi
+    return {
+        f"{roi}_{side}": [f"{reg}_{side}" for reg in regions]
+        for side in ('L', 'R')
+        for roi, regions in roi_dict.items()
+    }
 
 def dk_connectome_reg2roi(c_dk_arr, roi_dict, dk_labels, dk_coords=None):
     """
@@ -261,35 +303,37 @@ def dk_connectome_reg2roi(c_dk_arr, roi_dict, dk_labels, dk_coords=None):
 
     rois = list(roi_dict.keys())
     n_rois = len(rois)
-    n_subjects = c_dk_arr.shape[-1]
+    n_regions = len(dk_labels)
 
-    c_arrs_roi = np.empty((n_rois, n_rois, n_subjects))
-    roi_coords = {roi: [] for roi in rois}
+    # create a mapping from each region to its corresponding ROI
+    region_to_roi = {region: roi for roi, regions in roi_dict.items() for region in regions}
 
-    # loop through all subjects
-    for i in range(n_subjects):
-        c_arr = np.triu(c_dk_arr[:, :, i])
-        df_c_arr = pd.DataFrame(c_arr, columns=dk_labels.keys(), index=dk_labels.keys())
-        df_c_arr.replace(0, np.nan, inplace=True)
+    # membership matrix (ROIs x regions) following the row/column order of the connectomes
+    roi_index = {roi: k for k, roi in enumerate(rois)}
+    membership = np.zeros((n_rois, n_regions))
+    for j, region in enumerate(dk_labels):
+        if region in region_to_roi:
+            membership[roi_index[region_to_roi[region]], j] = 1
 
-        # create a mapping from each region to its corresponding ROI
-        region_to_roi = {region: roi for roi, regions in roi_dict.items() for region in regions}
-        if dk_coords is not None:
-            for roi, regions in roi_dict.items():
-                for region in regions:
-                    roi_coords[roi].append(dk_coords[dk_labels[region] - 1]) # adjust index by -1 if needed
+    # only the non-zero, non-NaN upper-triangle entries of each subject's matrix (subjects x regions x regions) are averaged
+    c_arrs = np.moveaxis(np.asarray(c_dk_arr, dtype=float), -1, 0)
+    valid = np.triu(np.ones((n_regions, n_regions), dtype=bool)) & (c_arrs != 0) & ~np.isnan(c_arrs)
+    c_arrs = np.where(valid, c_arrs, 0)
 
-        # replace regions in the DataFrame with their ROI names and aggregate together
-        df_c_arr_roi = df_c_arr.rename(index=region_to_roi, columns=region_to_roi)
-        df_c_arr_roi = df_c_arr_roi.loc[rois, rois]
-        df_c_arr_roi = df_c_arr_roi.groupby(level=0, sort=False).mean().T.groupby(level=0, sort=False).mean()
+    # average the member regions of each ROI across the rows and then across the columns
+    row_counts = membership @ valid
+    c_rows = np.divide(membership @ c_arrs, row_counts, out=np.zeros(row_counts.shape), where=row_counts > 0)
+    col_counts = (row_counts > 0) @ membership.T
+    c_rois = np.divide(c_rows @ membership.T, col_counts, out=np.full(col_counts.shape, np.nan), where=col_counts > 0)
 
-        c_arrs_roi[:, :, i] = df_c_arr_roi.to_numpy()
+    # column ROIs end up on the first axis, as with the previous groupby of the transposed frame
+    c_arrs_roi = np.transpose(c_rois, (2, 1, 0))
 
     # calculate the center coordinates for each ROI
     if dk_coords is not None:
-        roi_center_coords = {roi: np.median(coords_list, axis=0) for roi, coords_list in roi_coords.items()}
-        roi_coords_arr = np.array(list(roi_center_coords.values()))
+        dk_coords = np.asarray(dk_coords)
+        roi_coords_arr = np.array([np.median(dk_coords[[dk_labels[region] - 1 for region in regions]], axis=0) # adjust index by -1 if needed
+                                   for regions in roi_dict.values()])
         return c_arrs_roi, roi_coords_arr
     
     return c_arrs_roi
@@ -1,4 +1,7 @@
 import os
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import bct
@@ -6,6 +9,54 @@ import bct
 from src.connectomics import connectivity
 from src.utils import io, transform
 
+def _read_connectome_file(connectome_path, verbose=True):
+    """Read in the raw connectome matrix based on the file extension."""
+
+    # infer the file type from the file extension
+    _, file_extension = os.path.splitext(connectome_path)
+    file_extension = file_extension.lower()
+
+    if file_extension == '.npy':
+        # copy-on-write memory map: only the pages modified by the post-processing are copied into memory
+        return io.read_npy(connectome_path, mmap_mode='c')
+    elif file_extension in ('.pkl', '.mat', '.csv'):
+        # parsed files are cached per modification time, so repeated reads of a subject skip the parsing
+        return _load_connectome(connectome_path, file_extension, os.path.getmtime(connectome_path))
+    else:
+        if verbose: print(f"Unsupported file extension: {file_extension}")
+        return None
+
+@lru_cache(maxsize=128)
+def _load_connectome(connectome_path, file_extension, mtime):
+    """Parse a .pkl, .mat or .csv connectome into a read-only array (copied by read_connectome before processing)."""
+
+    if file_extension == '.pkl':
+        connectome = io.read_pickle(connectome_path)
+    elif file_extension == '.mat':
+        connectome = io.read_mat(connectome_path)
+    else:
+        connectome = io.read_csv2npy(connectome_path)
+    connectome = np.asarray(connectome)
+    connectome.flags.writeable = False
+    return connectome
+
+def convert_connectome2npy(connectome_path, overwrite=False, verbose=True):
+    """Save the raw connectome next to its source file as .npy so that read_connectome can memory-map it."""
+
+    # check if the connectome_path is valid and the file exists
+    if pd.isna(connectome_path) or not os.path.isfile(connectome_path):
+        if verbose: print(f"The file {connectome_path} does not exist or the path is NaN.")
+        return None
+
+    npy_path = os.path.splitext(connectome_path)[0] + '.npy'
+    if npy_path == connectome_path or (os.path.isfile(npy_path) and not overwrite):
+        return npy_path
+
+    connectome = _read_connectome_file(connectome_path, verbose=verbose)
+    if connectome is None:
+        return None
+    return io.save_npy_sidecar(connectome, connectome_path)
+
 def read_connectome(connectome_path, fisher=False, standardise=False, not_negative=False, drop_first_roi=False, 
                     mask=None, replace_nan_with=None, verbose=True):
     """Read in the connectome."""
@@ -15,21 +66,18 @@ def read_connectome(connectome_path, fisher=False, standardise=False, not_negati
         if verbose: print(f"The file {connectome_path} does not exist or the path is NaN.")
         return None
 
-    # infer the file type from the file extension
-    _, file_extension = os.path.splitext(connectome_path)
-    file_extension = file_extension.lower()
-    
     # read in the connectome based on the file extension
-    if file_extension == '.pkl':
-        connectome = io.read_pickle(connectome_path)
-    elif file_extension == '.mat':
-        connectome = io.read_mat(connectome_path)
-    elif file_extension == '.csv':
-        connectome = io.read_csv2npy(connectome_path)
-    else:
-        if verbose: print(f"Unsupported file extension: {file_extension}")
+    connectome = _read_connectome_file(connectome_path, verbose=verbose)
+    if connectome is None:
         return None
 
+    # work on a single private floating-point buffer so that all steps below run in place
+    connectome = np.asarray(connectome)
+    if not np.issubdtype(connectome.dtype, np.floating):
+        connectome = connectome.astype(float)
+    elif not connectome.flags.writeable:
+        connectome = connectome.copy()
+
     np.fill_diagonal(connectome, 0)
 
     # drop first ROI in the matrix
@@ -38,69 +86,116 @@ def read_connectome(connectome_path, fisher=False, standardise=False, not_negati
     
     # set negative correlations to zero
     if not_negative:
-        connectome[connectome < 0] = 0 
+        np.maximum(connectome, 0, out=connectome)
     
     # replace NaNs with a value
     if isinstance(replace_nan_with, (int, float)) and np.isnan(connectome).any():
-        connectome = np.nan_to_num(connectome, nan=replace_nan_with)
+        np.nan_to_num(connectome, copy=False, nan=replace_nan_with)
 
     # fisher r-to-z transformation
     if fisher:
-        connectome = transform.fisher_r_to_z(connectome)
+        transform.fisher_r_to_z(connectome, out=connectome)
 
     if standardise:
-        connectome = (connectome - np.mean(connectome)) / np.std(connectome)
+        mean, std = connectome.mean(), connectome.std()
+        connectome -= mean
+        connectome /= std
     
     # apply a mask
     if mask is not None and mask.any():
-        connectome = connectome * mask
+        connectome *= mask
 
     return connectome
 
 def merge_connectomes(df, connectome_path_col, not_negative=False, drop_first_roi=False, 
-                      fisher=False, standardise=False, replace_nan_with=None, mask=None, verbose=True):
-    """Merge connectomes for subjects in dataframe with column for paths to the connectomes."""
+                      fisher=False, standardise=False, replace_nan_with=None, mask=None, verbose=True,
+                      max_workers=None):
+    """Merge connectomes for subjects in dataframe with column for paths to the connectomes (read in parallel threads)."""
 
-    # Initialize empty lists to hold the correlation matrices and indices of NaN matrices
-    connectomes = []
+    # Initialize the output array (allocated once the matrix size is known) and indices of NaN matrices
+    connectomes = None
+    n_valid = 0
     nan_mids = []
-
-    for i, row in df.iterrows():
-        connectome = read_connectome(connectome_path=row[connectome_path_col], 
-                                     fisher=fisher, 
-                                     standardise=standardise, 
-                                     drop_first_roi=drop_first_roi,
-                                     not_negative=not_negative,
-                                     replace_nan_with=replace_nan_with,
-                                     mask=mask,
-                                     verbose=verbose)
-
-        # Check for None or NaN values and exclude the subject if such values are present
-        if connectome is None:
-            if verbose: print(f"Missing connectome path for {row['mid']}")
-            nan_mids.append(row['mid'])
-        elif np.isnan(connectome).any():
-            if verbose: print(f"NaN values detected in the connectome; excluding {row['mid']})")
-            nan_mids.append(row['mid'])
-        elif (connectome==0).all():
-            if verbose: print(f"All zero values detected in the connectome; excluding {row['mid']})")
-            nan_mids.append(row['mid'])
-        else:
-            # Append the processed correlation matrix to our list
-            connectomes.append(connectome)
-
-    # Convert the list of correlation matrices to a 3D numpy array
-    connectomes = np.stack(connectomes, axis=2)
+    abs_buffer = None
+
+    # Read the connectomes in a thread pool as reading is I/O bound (results are returned in row order)
+    def _read(connectome_path):
+        return read_connectome(connectome_path=connectome_path, 
+                               fisher=fisher, 
+                               standardise=standardise, 
+                               drop_first_roi=drop_first_roi,
+                               not_negative=not_negative,
+                               replace_nan_with=replace_nan_with,
+                               mask=mask,
+                               verbose=verbose)
+
+    paths = df[connectome_path_col].to_numpy()
+    mids = df['mid'].to_numpy()
+    if max_workers is None:
+        max_workers = min(32, max(1, len(df)))
+
+    # Keep a bounded window of reads in flight, so that loaded matrices do not pile up before being copied into the output
+    def _read_in_order(executor, max_in_flight):
+        pending = deque()
+        for mid, connectome_path in zip(mids, paths):
+            pending.append((mid, executor.submit(_read, connectome_path)))
+            if len(pending) >= max_in_flight:
+                mid, future = pending.popleft()
+                yield mid, future.result()
+        while pending:
+            mid, future = pending.popleft()
+            yield mid, future.result()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for mid, connectome in _read_in_order(executor, 2 * max_workers):
+            # Check for None or NaN values and exclude the subject if such values are present
+            if connectome is None:
+                if verbose: print(f"Missing connectome path for {mid}")
+                nan_mids.append(mid)
+                continue
+
+            # A single sum of magnitudes is NaN if any value is NaN and zero only if all values are zero
+            # (the magnitudes go into one scratch buffer reused across subjects)
+            if abs_buffer is None or abs_buffer.shape != connectome.shape:
+                abs_buffer = np.empty(connectome.shape, dtype=np.float64)
+            magnitude = np.add.reduce(np.abs(connectome, out=abs_buffer), axis=None)
+            if np.isnan(magnitude):
+                if verbose: print(f"NaN values detected in the connectome; excluding {mid})")
+                nan_mids.append(mid)
+            elif magnitude == 0:
+                if verbose: print(f"All zero values detected in the connectome; excluding {mid})")
+                nan_mids.append(mid)
+            else:
+                # Write the processed correlation matrix straight into the 3D output array
+                # (float64 at least, so that later matrices are never downcast to the first one's dtype)
+                if connectomes is None:
+                    connectomes = np.empty(connectome.shape + (len(df),), dtype=np.result_type(connectome.dtype, np.float64))
+                connectomes[:, :, n_valid] = connectome
+                n_valid += 1
+
+    if connectomes is None:
+        raise ValueError("No valid connectomes found to merge.")
+
+    # Keep only the slots filled with valid connectomes (copied when subjects were excluded, freeing the full buffer)
+    connectomes = np.ascontiguousarray(connectomes[:, :, :n_valid])
 
     # Remove the rows from the DataFrame that correspond to NaN matrices
     df_cl = df[~df['mid'].isin(nan_mids)]
 
     return df_cl, connectomes
 
+@lru_cache(maxsize=None)
+def _triu_indices(n_rois):
+    """Indices of the upper triangle (above the diagonal) of an n_rois x n_rois matrix."""
+    rows, cols = np.triu_indices(n_rois, k=1)
+    rows.flags.writeable = cols.flags.writeable = False
+    return rows, cols
+
 def get_percentile_mask(connectome, percentile):
     """Get a binary mask of connectome's top percentile values."""
 
-    thr = np.percentile(np.triu(connectome, k=1), percentile)
+    # threshold on the upper-triangle edges only (without the zero-padded lower triangle and diagonal)
+    thr = np.percentile(connectome[_triu_indices(connectome.shape[0])], percentile)
     mask = np.where(connectome >= thr, 1, 0)
     return mask
 
@@ -136,12 +231,11 @@ def calculate_nodal_strength(connectome_path, fisher=False, standardise=False, d
     if connectome is None:
         return None
     
-    # Calculate percentile mask and apply it on the connectome
+    # Calculate nodal strength for the nodes of the connectome (within the percentile mask if given)
     if percentile is not None:
         perc_mask = get_percentile_mask(connectome, percentile)
-        connectome = connectome * perc_mask
-
-    # Calculate nodal strength for the nodes of the connectome
-    nodal_strength = np.sum(connectome, axis=1)
+        nodal_strength = np.einsum('ij,ij->i', connectome, perc_mask)
+    else:
+        nodal_strength = np.sum(connectome, axis=1)
 
     return nodal_strength
@@ -1,5 +1,6 @@
 # to-do: generalise QC function
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -16,29 +17,24 @@ def QC(df_tseg:pd.DataFrame, tracts:list, metric='tract_vol', zscore_thr=-2, plo
 
     # plot the summary
     if plot:
-        metric_cols = [f'{metric}_{tract}' for tract in tracts]
-        QC_cols = [f'QC_zs_{metric}_{tract}_thr' for tract in tracts]
-        
-        df_metrics = df_tseg_QC.melt(id_vars=['mid', 'date', 'mri_date__index'], 
-                                value_vars=metric_cols,
-                                var_name='tract', value_name=metric)
-        df_QC = df_tseg_QC.melt(id_vars=['mid', 'date', 'mri_date__index'], 
-                                value_vars=QC_cols,
-                                var_name='tract', value_name='QC')
-
-        df_metrics['tract'] = df_metrics['tract'].str.replace(f'{metric}_', '')
-        df_QC['tract'] = df_QC['tract'].str.replace(f'QC_zs_{metric}_', '').str.replace('_thr', '')
-
-        df_melt = pd.merge(df_metrics, df_QC, on=['mid', 'date', 'mri_date__index', 'tract'])
+        # build the long-form data (one row per subject and tract) directly from the wide columns
+        df_melt = pd.DataFrame({
+            'mid': np.tile(df_tseg_QC['mid'].to_numpy(), len(tracts)),
+            'tract': np.repeat(tracts, len(df_tseg_QC)),
+            metric: np.concatenate([df_tseg_QC[f'{metric}_{tract}'].to_numpy() for tract in tracts]),
+            'QC': np.concatenate([df_tseg_QC[f'QC_zs_{metric}_{tract}_thr'].to_numpy() for tract in tracts]),
+        })
 
         _, ax = plt.subplots(1, 1, figsize=(10, 5))
         ax = sns.stripplot(ax=ax, data=df_melt, x='tract', y=metric, hue='QC', alpha=0.5,
                            palette={0: 'blue', 1: 'red'})
         
-        for tract in tracts:
-            count_0 = df_melt[(df_melt['tract'] == tract) & (df_melt['QC'] == 0)].shape[0]
-            count_1 = df_melt[(df_melt['tract'] == tract) & (df_melt['QC'] == 1)].shape[0]
-            ax.text(x=tracts.index(tract), y=df_melt[metric].max()+8, s=f'> {zscore_thr} SD: {count_0}', color='blue', ha='center')
-            ax.text(x=tracts.index(tract), y=df_melt[metric].max()+5, s=f'< {zscore_thr} SD: {count_1}', color='red', ha='center')
+        # count subjects within and beyond the threshold for each tract
+        counts = df_melt.groupby(['tract', 'QC']).size().unstack(fill_value=0)
+        counts = counts.reindex(index=tracts, columns=[0, 1], fill_value=0)
+        y_max = df_melt[metric].max()
+        for i, tract in enumerate(tracts):
+            ax.text(x=i, y=y_max+8, s=f'> {zscore_thr} SD: {counts.loc[tract, 0]}', color='blue', ha='center')
+            ax.text(x=i, y=y_max+5, s=f'< {zscore_thr} SD: {counts.loc[tract, 1]}', color='red', ha='center')
 
     return df_tseg_QC
\ No newline at end of file
@@ -2,25 +2,121 @@ import numpy as np
 import pandas as pd
 import warnings
 
-def determine_amyloid_status(row, pet_col='fnc_ber_com_composite', 
+def determine_amyloid_status(df, pet_col='fnc_ber_com_composite', 
                              cutoff=1.033, csf_ratio_col='Abnormal_CSF_Ab42_Ab40_Ratio'):
     """
     Set amyloid-positivity status for each row in dataframe based on Ab-PET or CSF Ab42/40 ratio.
     
     Args:
-        row (pd.Series): A row from the DataFrame.
+        df (pd.DataFrame): DataFrame containing the Ab-PET and CSF data.
         pet_col (str): The column name for Ab-PET data.
         cutoff (float): The cutoff value for determining amyloid positivity from PET data.
         csf_ratio_col (str): The column name for CSF data (binary).
     
     Returns:
-        int or float: 1 if amyloid positive, 0 if not, and NaN if no data is available.
+        pd.Series: 1 if amyloid positive, 0 if not, and NaN if no data is available.
     """
-    if pd.notna(row[pet_col]):
-        return int(row[pet_col] > cutoff)
-    elif csf_ratio_col and pd.notna(row[csf_ratio_col]):
-        return int(row[csf_ratio_col] == 1)
-    return np.nan
+    # PET status takes precedence wherever PET data is available
+    pet = df[pet_col].to_numpy(dtype=float, na_value=np.nan)
+    status = np.where(np.isnan(pet), np.nan, pet > cutoff)
+
+    # fall back to CSF status for the remaining rows
+    if csf_ratio_col:
+        csf = df[csf_ratio_col].to_numpy(dtype=float, na_value=np.nan)
+        use_csf = np.isnan(status) & ~np.isnan(csf)
+        status[use_csf] = csf[use_csf] == 1
+    return pd.Series(status, index=df.index)
+
+def _index_columns(df, prefixes, regions, side_substrs):
+    """
+    Map each (prefix, region, side) to the first column containing all three as substrings, in a single pass over the columns.
+    
+    Args:
+        df (pd.DataFrame): DataFrame whose columns are indexed.
+        prefixes (list): Column prefixes to index (e.g., PET and volume prefixes).
+        regions (list): Region names.
+        side_substrs (list): Substrings indicating hemisphere.
+    
+    Returns:
+        dict: Mapping of (prefix, region, side) to the first matching column.
+    """
+    col_index = {}
+    for col in df.columns:
+        for prefix in prefixes:
+            if prefix not in col:
+                continue
+            for side in side_substrs:
+                if side not in col:
+                    continue
+                for region in regions:
+                    if region in col:
+                        col_index.setdefault((prefix, region, side), col)
+    return col_index
+
+def _compute_roi_average(df, roi_regions, side_substrs, value_prefix, vol_prefix=None):
+    """
+    Compute the numerator and denominator of the ROI average, weighted by volume when a volume column exists.
+    
+    Args:
+        df (pd.DataFrame): DataFrame containing the regional values (and volumes).
+        roi_regions (list): List of region names to include in the calculation.
+        side_substrs (list): List of substrings indicating hemisphere.
+        value_prefix (str): Prefix of the value columns.
+        vol_prefix (str or None): Prefix of the volume columns, or None for an unweighted average.
+    
+    Returns:
+        tuple: (numerator, denominator) of the ROI average.
+    """
+    col_index = _index_columns(df, [value_prefix, vol_prefix] if vol_prefix else [value_prefix], roi_regions, side_substrs)
+
+    value_cols, vol_cols = [], []
+    # loop through all regions for both hemispheres
+    for region in roi_regions:
+        for side in side_substrs:
+            # identify value and volume columns
+            value_col = col_index.get((value_prefix, region, side))
+            if not value_col:
+                continue
+            value_cols.append(value_col)
+            vol_cols.append(col_index.get((vol_prefix, region, side)) if vol_prefix else None)
+    if not value_cols:
+        return 0, 0
+
+    # order the volume-weighted regions first so both groups are contiguous column blocks
+    pairs = sorted(zip(value_cols, vol_cols), key=lambda pair: pair[1] is None)
+    n_weighted = sum(vol_col is not None for _, vol_col in pairs)
+    values = _stack_columns(df, [value_col for value_col, _ in pairs])
+    volumes = _stack_columns(df, [vol_col for _, vol_col in pairs[:n_weighted]])
+    numerator, denominator = _weighted_sums(values, volumes)
+    return pd.Series(numerator, index=df.index), pd.Series(denominator, index=df.index)
+
+def _stack_columns(df, cols):
+    """Copy the given DataFrame columns into one preallocated column-major float64 array."""
+    arr = np.empty((len(df), len(cols)), dtype=np.float64, order='F')
+    for k, col in enumerate(cols):
+        arr[:, k] = df[col].to_numpy(dtype=np.float64)
+    return arr
+
+def _weighted_sums(values, volumes):
+    """
+    Row-wise numerator and denominator of the volume-weighted mean of values.
+    The first volumes.shape[1] columns of values are weighted by volumes, the remaining ones by one.
+    """
+    n_weighted = volumes.shape[1]
+    # fused multiply-sum for the weighted block, plain sums for the unit-weight block (no temporary arrays)
+    numerator = np.einsum('ij,ij->i', values[:, :n_weighted], volumes)
+    numerator += values[:, n_weighted:].sum(axis=1)
+    denominator = volumes.sum(axis=1)
+    denominator += values.shape[1] - n_weighted
+    return numerator, denominator
+
+def _divide_roi_average(numerator, denominator):
+    """Divide the ROI sums from _compute_roi_average, keeping the numerator where the denominator is not positive."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi_avg = np.where(np.asarray(denominator) > 0, np.divide(numerator, denominator), numerator)
+    if isinstance(numerator, pd.Series):
+        return pd.Series(roi_avg, index=numerator.index)
+    return roi_avg[()]
 
 def compute_roi_amyloid(df, roi_regions, side_substrs, pet_prefix='fnc_sr_mr_fs_', vol_prefix='fnc_vx_fs_'):
     """
@@ -36,27 +132,8 @@ def compute_roi_amyloid(df, roi_regions, side_substrs, pet_prefix='fnc_sr_mr_fs_
     Returns:
         float: Volume-weighted or unweighted average amyloid SUVR across specified regions.
     """
-    numerator = 0
-    denominator = 0
-    # loop through all regions for both hemispheres
-    for region in roi_regions:
-        for side in side_substrs:
-            # identify amyloid uptake and volume columns
-            amy_col = next((col for col in df.columns if region in col 
-                            and pet_prefix in col and side in col), None)
-            vol_col = next((col for col in df.columns if region in col 
-                            and vol_prefix in col and side in col), None)
-            # if both tau and volume are available, add to nominator and denominator
-            if amy_col and vol_col:
-                numerator += df[amy_col] * df[vol_col]
-                denominator += df[vol_col]
-            elif amy_col and not vol_col:
-                numerator += df[amy_col]
-                denominator += 1
-    try:
-        roi_amy = numerator / denominator
-    except:
-        roi_amy = numerator
+    numerator, denominator = _compute_roi_average(df, roi_regions, side_substrs, pet_prefix, vol_prefix)
+    roi_amy = _divide_roi_average(numerator, denominator)
     return roi_amy
 
 def compute_roi_tau(df, roi_regions, side_substrs, pet_prefix='tnic_sr_mr_fs_', vol_prefix="tnic_vx_fs_"):
@@ -78,40 +155,15 @@ def compute_roi_tau(df, roi_regions, side_substrs, pet_prefix='tnic_sr_mr_fs_',
         - For non-partial volume corrected values ('tnic'), the function weights tau values by region volumes.
         - For partial volume corrected values ('tgic'), the function calculates a simple average.
     """
-    numerator = 0
-    denominator = 0
-    # loop through all regions for both hemispheres
-    for region in roi_regions:
-        for side in side_substrs:
-            # identify tau uptake columns
-            tau_col = next((col for col in df.columns if region in col 
-                            and pet_prefix in col and side in col), None)
-            # if non partial volume corrected (tnic) values are used
-            if 'tnic' in pet_prefix:
-                # identify volume columns
-                vol_col = next((col for col in df.columns if region in col 
-                                and vol_prefix in col and side in col), None)
-                # if both tau and volume are available, add to nominator and denominator
-                if tau_col and vol_col:
-                    numerator += df[tau_col] * df[vol_col]
-                    denominator += df[vol_col]
-                elif tau_col and not vol_col:
-                    numerator += df[tau_col]
-                    denominator += 1
-            # if partial volume corrected (tgic) values instead
-            elif 'tgic' in pet_prefix:
-                if tau_col:
-                    numerator += df[tau_col]
-                    denominator += 1
     # return the ROI SUVR either weighted by volume or not
     if 'tnic' in pet_prefix:
-        try:
-            return numerator / denominator
-        except:
+        numerator, denominator = _compute_roi_average(df, roi_regions, side_substrs, pet_prefix, vol_prefix)
+        if np.any(np.asarray(denominator) <= 0):
             warnings.warn(f"SUVR values not divided by volumes due to divide by zero in ROIs: {roi_regions}", UserWarning)
-            return numerator
+        return _divide_roi_average(numerator, denominator)
     elif 'tgic' in pet_prefix:
-        return numerator / denominator
+        numerator, denominator = _compute_roi_average(df, roi_regions, side_substrs, pet_prefix, None)
+        return _divide_roi_average(numerator, denominator)
 
 def compute_roi_ct(df, roi_regions, side_substrs, prefix='aparc_ct_avg_'):
     """
@@ -130,18 +182,7 @@ def compute_roi_ct(df, roi_regions, side_substrs, prefix='aparc_ct_avg_'):
         This function calculates a simple average of cortical thickness values
         across all specified regions and hemispheres without volume weighting.
     """
-    numerator = 0
-    denominator = 0
-    for region in roi_regions:
-        for side in side_substrs:
-            ct_col = next((col for col in df.columns if region in col 
-                          and prefix in col and side in col), None)
-            if ct_col:
-                numerator += df[ct_col]
-                denominator += 1
-    try:
-        roi_ct = numerator / denominator
-    except:
-        roi_ct = numerator
+    numerator, denominator = _compute_roi_average(df, roi_regions, side_substrs, prefix, None)
+    roi_ct = _divide_roi_average(numerator, denominator)
 
-    return roi_ct
\ No newline at end of file
+    return roi_ct
@@ -4,6 +4,39 @@ import matplotlib.pyplot as plt
 from scipy.stats import norm
 from sklearn.mixture import GaussianMixture
 
+# fitted GMMs for recently seen score arrays (keyed by the raw bytes of the scores)
+_GMM_CACHE = {}
+_GMM_CACHE_SIZE = 128
+
+def _fit_gmm2(scores):
+    """Fit a two-component GMM on the scores (cached per input) and return the means and variances sorted by mean."""
+    scores = np.ascontiguousarray(scores, dtype=np.float64).reshape(-1, 1)
+    if not np.isfinite(scores).all():
+        raise ValueError("Scores for the GMM contain NaN or infinite values.")
+    key = scores.tobytes()
+    if key not in _GMM_CACHE:
+        gmm = GaussianMixture(n_components=2, random_state=0).fit(scores)
+        means = gmm.means_.flatten()
+        vars = gmm.covariances_.flatten()
+        order = np.argsort(means)
+        # drop the oldest fit once the cache is full
+        if len(_GMM_CACHE) >= _GMM_CACHE_SIZE:
+            _GMM_CACHE.pop(next(iter(_GMM_CACHE)))
+        _GMM_CACHE[key] = (*means[order], *vars[order])
+    return _GMM_CACHE[key]
+
+def _gaussian_intersection(m1, v1, m2, v2):
+    """Find the intersection of two Gaussian densities (m1 <= m2) between their means, or None if they do not cross there."""
+    a = 1 / (2 * v1) - 1 / (2 * v2)
+    b = m2 / v2 - m1 / v1
+    c = m1**2 / (2 * v1) - m2**2 / (2 * v2) - np.log(np.sqrt(v2 / v1))
+    roots = np.roots([a, b, c])
+    roots = roots[np.isreal(roots)].real
+
+    # first real root (in np.roots order, as before) that lies between the means
+    roots = roots[(roots >= m1) & (roots <= m2)]
+    return roots[0] if roots.size > 0 else None
+
 def is_above_cutoff(series, cutoff):
     """Check if values in series are above cut-off."""
     return series > cutoff
@@ -24,22 +57,10 @@ def find_combined_cutoff(scores_gmm, scores_2std, roi_name='roi', plot_gmm=False
     """
 
     # fit GMM
-    gmm = GaussianMixture(n_components=2, random_state=0).fit(scores_gmm.reshape(-1, 1))
-    means = gmm.means_.flatten()
-    vars = gmm.covariances_.flatten()
-    m1, m2 = np.sort(means)
-    v1, v2 = vars[np.argsort(means)]
+    m1, m2, v1, v2 = _fit_gmm2(scores_gmm)
     
     # find intersection point
-    def intersection(m1, v1, m2, v2):
-        a = 1 / (2 * v1) - 1 / (2 * v2)
-        b = m2 / v2 - m1 / v1
-        c = m1**2 / (2 * v1) - m2**2 / (2 * v2) - np.log(np.sqrt(v2 / v1))
-        roots = np.roots([a, b, c])
-        return roots[np.isreal(roots)].real
-    
-    inter_points = intersection(m1, v1, m2, v2)
-    gmm_cutoff = inter_points[0] if inter_points.size > 0 else None
+    gmm_cutoff = _gaussian_intersection(m1, v1, m2, v2)
     
     # calculate 2SD cutoff
     mean_neg = np.mean(scores_2std)
@@ -87,26 +108,14 @@ def find_gmm_cutoff(scores_gmm, roi_name='roi', plot_gmm=False, verbose=False):
     """
     
     # fit GMM
-    gmm = GaussianMixture(n_components=2, random_state=0).fit(scores_gmm.reshape(-1, 1))
-    means = gmm.means_.flatten()
-    vars = gmm.covariances_.flatten()
-    m1, m2 = np.sort(means)
-    v1, v2 = vars[np.argsort(means)]
+    m1, m2, v1, v2 = _fit_gmm2(scores_gmm)
     
     # find intersection point
-    def intersection(m1, v1, m2, v2):
-        a = 1 / (2 * v1) - 1 / (2 * v2)
-        b = m2 / v2 - m1 / v1
-        c = m1**2 / (2 * v1) - m2**2 / (2 * v2) - np.log(np.sqrt(v2 / v1))
-        roots = np.roots([a, b, c])
-        return roots[np.isreal(roots)].real
-    
-    inter_points = intersection(m1, v1, m2, v2)
-    gmm_cutoff = inter_points[0] if inter_points.size > 0 else None
+    gmm_cutoff = _gaussian_intersection(m1, v1, m2, v2)
 
     # output results
     if verbose:
-        print(f'{roi_name} GMM cut-off = {gmm_cutoff:.3f}')
+        print(f'{roi_name} GMM cut-off = {gmm_cutoff:.3f}' if gmm_cutoff is not None else f'{roi_name} GMM cut-off not found')
     
     # plot if requested
     if plot_gmm:
@@ -115,11 +124,43 @@ def find_gmm_cutoff(scores_gmm, roi_name='roi', plot_gmm=False, verbose=False):
         x = np.linspace(min(scores_gmm), max(scores_gmm), 1000)
         plt.plot(x, norm.pdf(x, m1, np.sqrt(v1)), '-k', alpha=0.5)
         plt.plot(x, norm.pdf(x, m2, np.sqrt(v2)), '-k', alpha=0.5)
-        plt.axvline(gmm_cutoff, color='r', linestyle='--', label=f'GMM cutoff ({gmm_cutoff:.3f})')
+        if gmm_cutoff is not None:
+            plt.axvline(gmm_cutoff, color='r', linestyle='--', label=f'GMM cutoff ({gmm_cutoff:.3f})')
         plt.xlabel('Scores')
         plt.ylabel('Density')
         plt.title(f'GMM Cut-off for {roi_name}')
         plt.legend(loc='upper right')
         plt.show()
     
-    return gmm_cutoff
\ No newline at end of file
+    return gmm_cutoff
+
+def fit_cutoffs_parallel(scores_by_roi, method='gmm', n_jobs=-1, verbose=False):
+    """
+    Find the cutoffs of many ROIs at once, fitting the ROIs in parallel processes.
+    
+    Args:
+        scores_by_roi (dict): ROI name -> scores for the GMM method (method='gmm'), or
+            ROI name -> (scores for GMM method, scores for 2SD method) (method='combined').
+        method (str): 'gmm' (find_gmm_cutoff) or 'combined' (find_combined_cutoff).
+        n_jobs (int): Number of worker processes (-1 uses all cores, 1 runs serially).
+        verbose (bool): Whether to print verbose output.
+    
+    Returns:
+        dict: ROI name -> cutoff value.
+    """
+
+    if method == 'gmm':
+        jobs = [(find_gmm_cutoff, (scores,), roi_name) for roi_name, scores in scores_by_roi.items()]
+    elif method == 'combined':
+        jobs = [(find_combined_cutoff, tuple(scores), roi_name) for roi_name, scores in scores_by_roi.items()]
+    else:
+        raise ValueError(f"Unknown method '{method}' (expected 'gmm' or 'combined').")
+
+    # joblib is only needed for the parallel path
+    if n_jobs == 1 or len(jobs) < 2:
+        cutoffs = [func(*args, roi_name=roi_name, verbose=verbose) for func, args, roi_name in jobs]
+    else:
+        from joblib import Parallel, delayed
+        cutoffs = Parallel(n_jobs=n_jobs, prefer='processes')(
+            delayed(func)(*args, roi_name=roi_name, verbose=verbose) for func, args, roi_name in jobs)
+    return dict(zip(scores_by_roi, cutoffs))
@@ -31,14 +31,28 @@ def calculate_regional_laterality(df, cols, prefix='', suffix='_LI'):
         pd.DataFrame: DataFrame with added laterality index columns.
     """
     left_columns = [col for col in cols if '_lh_' in col or '_Left' in col]
-    right_columns = [col for col in cols if '_rh_' in col or '_Right' in col]
+    right_columns = {col for col in cols if '_rh_' in col or '_Right' in col}
 
-    region_pairs = [(left, left.replace('_lh_', '_rh_').replace('_Left', '_Right')) 
-                    for left in left_columns if left.replace('_lh_', '_rh_').replace('_Left', '_Right') in right_columns]
-    
-    for left_col, right_col in region_pairs:
-        region_name = left_col.split('_lh_')[1] if '_lh_' in left_col else left_col.split('_Left_')[1]
-        li_col = f"{prefix}{region_name}{suffix}"
-        df[li_col] = laterality_index(df[left_col], df[right_col])
+    # map each laterality index column to its pair of left and right columns
+    region_pairs = {}
+    for left_col in left_columns:
+        right_col = left_col.replace('_lh_', '_rh_').replace('_Left', '_Right')
+        if right_col in right_columns:
+            region_name = left_col.split('_lh_')[1] if '_lh_' in left_col else left_col.split('_Left_')[1]
+            region_pairs[f"{prefix}{region_name}{suffix}"] = (left_col, right_col)
+    if not region_pairs:
+        return df
+
+    # compute the laterality indices of all regions at once (as laterality_index: NaN or ±inf where left and right sum to zero)
+    li_cols = list(region_pairs)
+    left = df[[left_col for left_col, _ in region_pairs.values()]].to_numpy(dtype=float)
+    right = df[[right_col for _, right_col in region_pairs.values()]].to_numpy(dtype=float, copy=True)
+    li = np.subtract(right, left)
+    total = np.add(right, left, out=right)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(li, total, out=li)
+    li *= 100
 
+    # assign all laterality index columns into df in one go (existing ones are overwritten in place)
+    df[li_cols] = li
     return df
@@ -9,7 +9,7 @@ def save_to_pickle(data, filename):
 
     filepath = os.path.abspath(filename)
     with open(filepath, 'wb') as f:
-        pickle.dump(data, f)
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
     return filepath
 
 def read_pickle(filepath):
@@ -19,14 +19,73 @@ def read_pickle(filepath):
         var = pickle.load(f)
     return var
 
-def read_mat(filepath):
-    """Import data from a Matlab file."""
+def read_mat(filepath, cache=False):
+    """Import data from a Matlab file (v5 or v7.3), optionally cached in a .cache.npy sidecar next to it."""
     
-    var = loadmat(filepath)
-    return list(var.values())[3]
+    # reuse the sidecar while it matches the Matlab file (copy-on-write, so writable like a fresh read)
+    if cache:
+        var = read_npy_sidecar(filepath, suffix='.cache.npy')
+        if var is not None:
+            return var
+
+    # v7.3 files are HDF5 (signature after the 512-byte MATLAB header), which loadmat cannot read
+    with open(filepath, 'rb') as f:
+        f.seek(512)
+        is_hdf5 = f.read(8) == b'\x89HDF\r\n\x1a\n'
+    if is_hdf5:
+        import h5py
+        with h5py.File(filepath, 'r') as h5:
+            # first variable (HDF5 stores MATLAB's column-major arrays with reversed axes)
+            key = next(k for k in h5.keys() if not k.startswith('#'))
+            var = h5[key][()].T
+    else:
+        var = list(loadmat(filepath).values())[3]
+
+    # only plain numeric arrays are cached (cells/structs would need pickling)
+    if cache and isinstance(var, np.ndarray) and not var.dtype.hasobject:
+        try:
+            save_npy_sidecar(var, filepath, suffix='.cache.npy')
+        except OSError:
+            pass
+    return var
+
+def read_npy(filepath, mmap_mode=None):
+    """Import data from a NumPy file, optionally memory-mapped (e.g. mmap_mode='r' or copy-on-write 'c')."""
+
+    var = np.load(filepath, mmap_mode=mmap_mode)
+    return var
 
 def read_csv2npy(filepath):
     """Import data from a CSV file."""
 
+    # parse purely numeric comma-separated matrices straight into an array (checked on the first line)
+    with open(filepath) as f:
+        first_row = f.readline().split(',')
+    try:
+        [float(value) for value in first_row]
+        return np.loadtxt(filepath, delimiter=',', dtype=np.float64, ndmin=2)
+    except ValueError:
+        pass
+
     var = pd.read_csv(filepath, header=None).to_numpy()
-    return var
\ No newline at end of file
+    return var
+
+def save_npy_sidecar(data, filepath, suffix='.npy'):
+    """Save data as a .npy file next to its source file, stamped with the source's modification time."""
+
+    npy_path = os.path.splitext(filepath)[0] + suffix
+    np.save(npy_path, np.asarray(data))
+    source = os.stat(filepath)
+    os.utime(npy_path, ns=(source.st_atime_ns, source.st_mtime_ns))
+    return npy_path
+
+def read_npy_sidecar(filepath, suffix='.npy'):
+    """Memory-map (copy-on-write) the .npy sidecar of a source file if it is stamped with the source's modification time."""
+
+    npy_path = os.path.splitext(filepath)[0] + suffix
+    try:
+        if os.stat(npy_path).st_mtime_ns == os.stat(filepath).st_mtime_ns:
+            return np.load(npy_path, mmap_mode='c')
+    except (OSError, ValueError):
+        pass
+    return None
@@ -1,20 +1,27 @@
 import os
+from functools import lru_cache
+from pathlib import Path
 
 def find_src_directory(start_path=None, max_levels=5):
     if start_path is None:
         start_path = os.getcwd()
     
-    current_path = os.path.abspath(start_path)
+    # absolute path (str or pathlib.Path) as a stable cache key
+    return _find_src_directory(os.path.abspath(start_path), max_levels)
+
+@lru_cache(maxsize=None)
+def _find_src_directory(start_path, max_levels):
+    current_path = Path(start_path)
     
     # Search up to max_levels directories up
     for _ in range(max_levels):
         # Check if 'src' exists in current directory
-        potential_src = os.path.join(current_path, 'src')
-        if os.path.isdir(potential_src):
-            return potential_src
+        potential_src = current_path / 'src'
+        if potential_src.is_dir():
+            return str(potential_src)
         
         # Move one level up
-        parent = os.path.dirname(current_path)
+        parent = current_path.parent
         if parent == current_path:  # Reached root directory
             break
         current_path = parent